@@ -6,15 +6,25 @@ Maps multiple fields to a form with automatic order_index assignment.
 
 import sys
 import os
-import re
+import uuid
+import weakref
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+import psycopg2.errors
+from psycopg2.extras import execute_values
 
 # Add current directory to path for imports
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from utils.db_connection import get_connection, test_connection
+from utils.db_connection import get_connection, release_connection, close_all_connections, test_connection
 from config.db_config import FORMS_TABLE, FORM_FIELDS_TABLE, FORM_FIELD_MAPPING_TABLE, SCHEMA
 
 
+# Punctuation removed during field name normalization: / - _ ( ) . ,
+# (whitespace, including Unicode whitespace, is removed with str.split)
+_NORMALIZE_STRIP_TABLE = str.maketrans("", "", "/-_().,")
+
+
 def normalize_field_name(name: str) -> str:
     """
     Normalize field name for comparison.
@@ -24,145 +34,306 @@ def normalize_field_name(name: str) -> str:
     """
     if not name:
         return ""
-    # Remove special characters and spaces
-    normalized = re.sub(r'[/\-_().,\s]', '', name.lower().strip())
-    return normalized
+    # Fast path: plain lowercase ASCII letters/digits are already normalized
+    if name.isascii() and name.isalnum() and name.islower():
+        return name
+    # Remove all whitespace, then special characters
+    return "".join(name.lower().split()).translate(_NORMALIZE_STRIP_TABLE)
+
+
+# Server-side normalization of stored field names, matched against
+# normalize_field_name(input). The two only agree for ASCII field names:
+# PostgreSQL's lower() and [:space:] depend on the database's LC_CTYPE, so
+# non-ASCII capitals (e.g. 'Å' under a C ctype) or U+00A0 in a stored
+# field_name may not normalize the way Python does and will not resolve.
+# Must stay in sync with _NORMALIZE_STRIP_TABLE and the functional index in
+# migrations/001_form_fields_normalized_name_index.sql.
+NORMALIZED_NAME_SQL = "lower(regexp_replace(field_name, '[/_().,[:space:]-]', '', 'g'))"
+
+# How long to wait for the background mappings prefetch before falling back
+# to the ON CONFLICT check in insert_mappings
+PREFETCH_TIMEOUT_SECONDS = 5
+
+# Separator lines for the preview table
+PREVIEW_RULE_HEAVY = "=" * 80
+PREVIEW_RULE_LIGHT = "-" * 80
+
+
+def parse_uuid(value: str) -> uuid.UUID:
+    """
+    Parse a UUID string into a uuid.UUID (sent to PostgreSQL as a native uuid),
+    or return None if the value is not a UUID in the 8-4-4-4-12 hex format.
+    """
+    try:
+        parsed = uuid.UUID(value)
+    except (ValueError, AttributeError, TypeError):
+        return None
+    # uuid.UUID also accepts braces, urn:uuid: and bare hex; require 8-4-4-4-12
+    return parsed if str(parsed) == value.lower() else None
+
+
+# Hot-path lookups, prepared once per connection so the server plans them only once.
+# name -> (parameter types, parameterized statement)
+STATEMENTS = {
+    "valid_form": (
+        ("uuid",),
+        f"SELECT id FROM {SCHEMA}.{FORMS_TABLE} WHERE id = %s::uuid"
+    ),
+    "fields_by_ids": (
+        ("uuid[]",),
+        f"SELECT id, field_name FROM {SCHEMA}.{FORM_FIELDS_TABLE} WHERE id = ANY(%s::uuid[])"
+    ),
+    "fields_by_normalized_names": (
+        ("text[]",),
+        f"SELECT id, field_name, {NORMALIZED_NAME_SQL} FROM {SCHEMA}.{FORM_FIELDS_TABLE} "
+        f"WHERE {NORMALIZED_NAME_SQL} = ANY(%s::text[])"
+    ),
+}
+
+# Connections on which STATEMENTS have been prepared
+_prepared_connections = weakref.WeakSet()
+
+
+def prepare_statements(cursor) -> bool:
+    """
+    PREPARE the hot-path lookups on this cursor's connection.
+    If PREPARE is not available, the helpers fall back to plain parameterized SQL.
+    """
+    conn = cursor.connection
+    if conn in _prepared_connections:
+        return True
+    try:
+        for name, (param_types, statement) in STATEMENTS.items():
+            placeholders = tuple(f"${i}" for i in range(1, len(param_types) + 1))
+            cursor.execute(
+                f"PREPARE {name} ({', '.join(param_types)}) AS {statement % placeholders}"
+            )
+        _prepared_connections.add(conn)
+        return True
+    except Exception as e:
+        print(f"⚠️  Prepared statements unavailable, using plain queries: {e}")
+        return False
 
 
-def validate_form_exists(conn, form_id: str) -> bool:
+def execute_statement(cursor, name: str, params: tuple):
+    """
+    Run one of STATEMENTS: EXECUTE the prepared version if this connection
+    has it, otherwise send the plain parameterized SQL.
+    """
+    param_types, statement = STATEMENTS[name]
+    if cursor.connection in _prepared_connections:
+        try:
+            placeholders = ", ".join(f"%s::{param_type}" for param_type in param_types)
+            cursor.execute(f"EXECUTE {name}({placeholders})", params)
+            return
+        except psycopg2.errors.InvalidSqlStatementName:
+            # Prepared statements did not survive (e.g. behind a transaction-pooling proxy)
+            _prepared_connections.discard(cursor.connection)
+    cursor.execute(statement, params)
+
+
+def open_session():
+    """
+    Take a connection from the pool and set it up for the CLI:
+    autocommit for read-only lookups, one reusable cursor, prepared statements.
+    Returns (conn, cursor), or (None, None) if no connection is available.
+    """
+    conn = get_connection()
+    if not conn:
+        return None, None
+    # Read-only lookups run in autocommit mode (no BEGIN/COMMIT per SELECT)
+    conn.autocommit = True
+    cursor = conn.cursor()
+    prepare_statements(cursor)
+    return conn, cursor
+
+
+def ensure_session(conn, cursor):
+    """
+    Return the session unchanged while its connection is alive.
+    If the connection broke, release it and open a new session from the pool.
+    """
+    if not conn.closed:
+        return conn, cursor
+    print("⚠️  Database connection lost. Reconnecting...")
+    release_connection(conn)
+    return open_session()
+
+
+def validate_form_exists(cursor, form_id: uuid.UUID) -> bool:
     """
     Check if the form_id exists in the forms table.
+    Returns None (not False) if the query failed because the connection was lost,
+    so the caller can reconnect instead of reporting the form as missing.
     """
     try:
-        cursor = conn.cursor()
-        cursor.execute(
-            f"SELECT id FROM {SCHEMA}.{FORMS_TABLE} WHERE id = %s",
-            (form_id,)
-        )
+        execute_statement(cursor, "valid_form", (form_id,))
         result = cursor.fetchone()
-        cursor.close()
-        conn.commit()  # Commit to end transaction block
         return result is not None
+    except psycopg2.OperationalError as e:
+        print(f"⚠️  Database connection problem while validating form: {e}")
+        return None
     except Exception as e:
-        conn.rollback()  # Reset transaction state
         print(f"❌ Error validating form: {e}")
         return False
 
 
-def get_field_by_id(conn, field_id: str) -> dict:
+def get_fields_by_ids(cursor, field_ids: list) -> dict:
     """
-    Get field details by field_id.
-    Returns dict with id and field_name, or None if not found.
+    Get field details for many field_ids in a single query.
+    Returns dict mapping field id (uuid.UUID) -> field_name.
+    Inputs that are not valid UUIDs are skipped (they can never match).
     """
+    valid_ids = []
+    for field_id in field_ids:
+        parsed = parse_uuid(field_id)
+        if parsed:
+            valid_ids.append(parsed)
+    if not valid_ids:
+        return {}
+
     try:
-        cursor = conn.cursor()
-        cursor.execute(
-            f"SELECT id, field_name FROM {SCHEMA}.{FORM_FIELDS_TABLE} WHERE id = %s",
-            (field_id,)
-        )
-        result = cursor.fetchone()
-        cursor.close()
-        conn.commit()  # Commit to end transaction block
-        if result:
-            return {"id": result[0], "field_name": result[1]}
-        return None
+        execute_statement(cursor, "fields_by_ids", (valid_ids,))
+        results = cursor.fetchall()
+        return {row[0]: row[1] for row in results}
     except Exception as e:
-        conn.rollback()  # Reset transaction state
-        print(f"❌ Error fetching field by ID: {e}")
-        return None
+        print(f"❌ Error fetching fields by ID: {e}")
+        return {}
 
 
-def get_all_fields(conn) -> list:
+def get_fields_by_normalized_names(cursor, normalized_names: list) -> list:
     """
-    Get all fields from form_fields table.
+    Get the fields whose normalized field_name matches any of the given names.
+    Normalization is done by PostgreSQL so only matching rows are fetched.
     Returns list of dicts with id, field_name, and normalized_name.
     """
+    if not normalized_names:
+        return []
+
     try:
-        cursor = conn.cursor()
-        cursor.execute(
-            f"SELECT id, field_name FROM {SCHEMA}.{FORM_FIELDS_TABLE}"
-        )
+        execute_statement(cursor, "fields_by_normalized_names", (normalized_names,))
         results = cursor.fetchall()
-        cursor.close()
-        conn.commit()  # Commit to end transaction block
         
-        fields = []
-        for row in results:
-            fields.append({
-                "id": row[0],
-                "field_name": row[1],
-                "normalized_name": normalize_field_name(row[1])
-            })
-        return fields
+        return [
+            {"id": row[0], "field_name": row[1], "normalized_name": row[2]}
+            for row in results
+        ]
     except Exception as e:
-        conn.rollback()  # Reset transaction state
         print(f"❌ Error fetching fields: {e}")
         return []
 
 
-def resolve_field_by_name(all_fields: list, input_name: str) -> dict:
+def build_field_index(fields: list) -> dict:
+    """
+    Build a lookup of normalized_name -> field dict.
+    If several fields normalize to the same name, the first one wins.
+    """
+    field_index = {}
+    for field in fields:
+        field_index.setdefault(field["normalized_name"], field)
+    return field_index
+
+
+def resolve_field_by_name(field_index: dict, input_name: str) -> dict:
     """
     Resolve a field by name using normalized comparison.
     Returns matching field dict or None.
     """
-    normalized_input = normalize_field_name(input_name)
-    
-    for field in all_fields:
-        if field["normalized_name"] == normalized_input:
-            return {
-                "id": field["id"],
-                "field_name": field["field_name"],
-                "input_name": input_name
-            }
+    field = field_index.get(normalize_field_name(input_name))
+    if field:
+        return {
+            "id": field["id"],
+            "field_name": field["field_name"],
+            "input_name": input_name
+        }
     return None
 
 
-def check_existing_mapping(conn, form_id: str, field_id: str) -> bool:
+def prefetch_form_mappings(form_id: uuid.UUID) -> set:
     """
-    Check if a mapping already exists for the given form_id and field_id.
+    Get all field ids already mapped to form_id, using its own pooled connection.
+    Meant to run in a background thread while the user is typing field inputs.
+    Returns a set of field ids (uuid.UUID), or None if the lookup failed.
     """
+    conn = get_connection()
+    if not conn:
+        return None
     try:
+        conn.autocommit = True
         cursor = conn.cursor()
-        cursor.execute(
-            f"SELECT id FROM {SCHEMA}.{FORM_FIELD_MAPPING_TABLE} WHERE form_id = %s AND field_id = %s",
-            (form_id, field_id)
-        )
-        result = cursor.fetchone()
-        cursor.close()
-        conn.commit()  # Commit to end transaction block
-        return result is not None
+        try:
+            cursor.execute(
+                f"SELECT field_id FROM {SCHEMA}.{FORM_FIELD_MAPPING_TABLE} WHERE form_id = %s",
+                (form_id,)
+            )
+            return {row[0] for row in cursor.fetchall()}
+        finally:
+            cursor.close()
     except Exception as e:
-        conn.rollback()  # Reset transaction state
-        print(f"❌ Error checking existing mapping: {e}")
-        return False
+        # Duplicates are still caught by ON CONFLICT in insert_mappings
+        print(f"\n⚠️  Could not prefetch existing mappings: {e}")
+        return None
+    finally:
+        release_connection(conn)
 
 
-def insert_mappings(conn, form_id: str, resolved_fields: list) -> bool:
+def insert_mappings(cursor, form_id: uuid.UUID, resolved_fields: list) -> bool:
     """
-    Insert all mappings in a single transaction.
+    Insert all mappings in a single transaction using one multi-row INSERT.
     Assigns order_index based on input order (1, 2, 3, ...).
+    Rows that already exist are skipped by ON CONFLICT (form_id, field_id) and
+    reported as duplicates; if any are found the whole transaction is rolled back.
+    Requires the unique index from migrations/002_form_field_mapping_unique_form_field.sql.
+    resolved_fields must not contain the same field id twice.
     Rolls back on any error.
     """
+    conn = cursor.connection
+    conn.autocommit = False  # Reads run in autocommit; the insert needs a real transaction
     try:
-        cursor = conn.cursor()
+        rows = [
+            (form_id, field["id"], index)
+            for index, field in enumerate(resolved_fields, start=1)
+        ]
+        inserted = execute_values(
+            cursor,
+            f"INSERT INTO {SCHEMA}.{FORM_FIELD_MAPPING_TABLE} (form_id, field_id, order_index) VALUES %s "
+            f"ON CONFLICT (form_id, field_id) DO NOTHING RETURNING field_id",
+            rows,
+            page_size=1000,
+            fetch=True
+        )
         
-        for index, field in enumerate(resolved_fields, start=1):
-            cursor.execute(
-                f"""
-                INSERT INTO {SCHEMA}.{FORM_FIELD_MAPPING_TABLE} (form_id, field_id, order_index)
-                VALUES (%s, %s, %s)
-                """,
-                (form_id, field["id"], index)
-            )
+        inserted_ids = {row[0] for row in inserted}
+        duplicates = [field for field in resolved_fields if field["id"] not in inserted_ids]
+        if duplicates or len(inserted) != len(rows):
+            conn.rollback()
+            if duplicates:
+                print("\n⚠️  The following fields already have mappings for this form:")
+                for dup in duplicates:
+                    print(f"   - {dup['input_name']}")
+            else:
+                print(f"\n⚠️  Only {len(inserted)} of {len(rows)} mappings would be inserted.")
+            print("❌ Transaction rolled back. No data was inserted.")
+            return False
         
         conn.commit()
-        cursor.close()
         return True
-    except Exception as e:
+    except psycopg2.errors.InvalidColumnReference:
+        # ON CONFLICT (form_id, field_id) needs the unique index from the migration
         conn.rollback()
+        print(f"❌ {SCHEMA}.{FORM_FIELD_MAPPING_TABLE} has no unique (form_id, field_id) index.")
+        print("❌ Run FormFieldMapping/migrations/002_form_field_mapping_unique_form_field.sql first.")
+        print("❌ Transaction rolled back. No data was inserted.")
+        return False
+    except Exception as e:
+        if not conn.closed:
+            conn.rollback()
         print(f"❌ Error inserting mappings: {e}")
         print("❌ Transaction rolled back. No data was inserted.")
         return False
+    finally:
+        if not conn.closed:
+            conn.autocommit = True
 
 
 def get_bulk_input(prompt: str) -> list:
@@ -175,6 +346,14 @@ def get_bulk_input(prompt: str) -> list:
     lines = []
     empty_count = 0
     
+    if not sys.stdin.isatty():
+        # Piped input: read straight from the stream instead of one input() per line
+        for line in iter(sys.stdin.readline, ""):
+            if line.strip() == "":
+                break
+            lines.append(line.strip())
+        return lines
+    
     while True:
         try:
             line = input()
@@ -194,27 +373,29 @@ def get_bulk_input(prompt: str) -> list:
 def display_preview_table(resolved_fields: list, input_mode: int):
     """
     Display the resolved fields preview table.
+    The table is built in memory and written to stdout in one call.
     """
-    print("\n" + "=" * 80)
-    print("Resolved Fields Preview")
-    print("=" * 80)
+    lines = ["", PREVIEW_RULE_HEAVY, "Resolved Fields Preview", PREVIEW_RULE_HEAVY]
     
     if input_mode == 1:  # Field ID mode
-        print(f"{'Field ID':<40} | {'Field Name':<35}")
-        print("-" * 80)
+        lines.append(f"{'Field ID':<40} | {'Field Name':<35}")
+        lines.append(PREVIEW_RULE_LIGHT)
         for field in resolved_fields:
-            field_id_display = str(field["id"])[:36] + "..." if len(str(field["id"])) > 36 else str(field["id"])
-            print(f"{field_id_display:<40} | {field['field_name']:<35}")
+            field_id = str(field["id"])
+            field_id_display = field_id[:36] + "..." if len(field_id) > 36 else field_id
+            lines.append(f"{field_id_display:<40} | {field['field_name']:<35}")
     else:  # Field Name mode
-        print(f"{'Input Name':<25} | {'Matched Field Name':<30} | {'Field ID':<20}")
-        print("-" * 80)
+        lines.append(f"{'Input Name':<25} | {'Matched Field Name':<30} | {'Field ID':<20}")
+        lines.append(PREVIEW_RULE_LIGHT)
         for field in resolved_fields:
-            field_id_display = str(field["id"])[:16] + "..." if len(str(field["id"])) > 16 else str(field["id"])
+            field_id = str(field["id"])
+            field_id_display = field_id[:16] + "..." if len(field_id) > 16 else field_id
             input_display = field["input_name"][:22] + "..." if len(field["input_name"]) > 22 else field["input_name"]
             matched_display = field["field_name"][:27] + "..." if len(field["field_name"]) > 27 else field["field_name"]
-            print(f"{input_display:<25} | {matched_display:<30} | {field_id_display:<20}")
+            lines.append(f"{input_display:<25} | {matched_display:<30} | {field_id_display:<20}")
     
-    print("=" * 80)
+    lines.append(PREVIEW_RULE_HEAVY)
+    sys.stdout.write("\n".join(lines) + "\n")
 
 
 def main():
@@ -227,13 +408,22 @@ def main():
     
     # Test database connection
     print("\n🔄 Testing database connection...")
-    conn = get_connection()
+    conn, cursor = open_session()
     if not conn:
         print("❌ Cannot proceed without database connection.")
         return
     print("✔ Database connected successfully!\n")
     
+    # Background worker for prefetching while waiting on user input
+    executor = ThreadPoolExecutor(max_workers=1)
+    
     while True:
+        # Replace the session's connection if it broke during the previous round
+        conn, cursor = ensure_session(conn, cursor)
+        if not conn:
+            print("❌ Cannot proceed without database connection.")
+            break
+        
         # Step 1: Form Selection
         print("-" * 60)
         form_id = input("Enter Form ID: ").strip()
@@ -242,13 +432,32 @@ def main():
             print("❌ Form ID cannot be empty.")
             continue
         
+        form_uuid = parse_uuid(form_id)
+        if not form_uuid:
+            print(f"❌ Form ID '{form_id}' is not a valid UUID.")
+            continue
+        
         # Validate form exists
         print("🔄 Validating form...")
-        if not validate_form_exists(conn, form_id):
+        form_exists = validate_form_exists(cursor, form_uuid)
+        if form_exists is None:
+            # Connection dropped while idle: reconnect and retry once
+            conn, cursor = ensure_session(conn, cursor)
+            if not conn:
+                print("❌ Cannot proceed without database connection.")
+                break
+            form_exists = validate_form_exists(cursor, form_uuid)
+        if form_exists is None:
+            print("❌ Database connection lost. Please try again.")
+            continue
+        if not form_exists:
             print(f"❌ Form with ID '{form_id}' does not exist.")
             continue
         print("✔ Form validated successfully!")
         
+        # Prefetch existing mappings for this form while the user types field inputs
+        mappings_future = executor.submit(prefetch_form_mappings, form_uuid)
+        
         # Get number of fields
         try:
             num_fields = int(input("\nEnter number of fields to map: ").strip())
@@ -299,39 +508,53 @@ def main():
         print("\n🔄 Resolving fields...")
         
         if input_mode == 1:
-            # Resolve by Field ID
+            # Resolve by Field ID (single batched lookup)
+            fields_by_id = get_fields_by_ids(cursor, field_inputs)
+            candidates = []
             for field_input in field_inputs:
-                field = get_field_by_id(conn, field_input)
-                if field:
-                    # Check for duplicate mapping
-                    if check_existing_mapping(conn, form_id, field["id"]):
-                        duplicate_mappings.append(field_input)
-                    else:
-                        resolved_fields.append({
-                            "id": field["id"],
-                            "field_name": field["field_name"],
-                            "input_name": field_input
-                        })
+                field_id = parse_uuid(field_input)
+                if field_id in fields_by_id:
+                    candidates.append({
+                        "id": field_id,
+                        "field_name": fields_by_id[field_id],
+                        "input_name": field_input
+                    })
                 else:
                     unresolved_inputs.append(field_input)
         else:
             # Resolve by Field Name
-            all_fields = get_all_fields(conn)
-            if not all_fields:
-                print("❌ Could not fetch fields from database.")
-                continue
-            
+            normalized_inputs = list({normalize_field_name(f) for f in field_inputs})
+            matched_fields = get_fields_by_normalized_names(cursor, normalized_inputs)
+            field_index = build_field_index(matched_fields)
+            candidates = []
             for field_input in field_inputs:
-                field = resolve_field_by_name(all_fields, field_input)
+                field = resolve_field_by_name(field_index, field_input)
                 if field:
-                    # Check for duplicate mapping
-                    if check_existing_mapping(conn, form_id, field["id"]):
-                        duplicate_mappings.append(field_input)
-                    else:
-                        resolved_fields.append(field)
+                    candidates.append(field)
                 else:
                     unresolved_inputs.append(field_input)
         
+        # Reject inputs that resolve to the same field more than once
+        seen_ids = set()
+        repeated_inputs = []
+        for field in candidates:
+            if field["id"] in seen_ids:
+                repeated_inputs.append(field["input_name"])
+            seen_ids.add(field["id"])
+        
+        # Check for duplicate mappings against the prefetched set. If the prefetch
+        # failed or is still hanging, insert_mappings rejects duplicates via ON CONFLICT.
+        try:
+            existing = mappings_future.result(timeout=PREFETCH_TIMEOUT_SECONDS) or set()
+        except FutureTimeoutError:
+            print("⚠️  Existing mappings prefetch timed out; duplicates will be checked on insert.")
+            existing = set()
+        for field in candidates:
+            if field["id"] in existing:
+                duplicate_mappings.append(field["input_name"])
+            else:
+                resolved_fields.append(field)
+        
         # Handle unresolved fields
         if unresolved_inputs:
             print("\n❌ The following fields could not be resolved:")
@@ -340,6 +563,14 @@ def main():
             print("\n❌ Cannot proceed with partial data. Please try again.")
             continue
         
+        # Handle fields entered more than once
+        if repeated_inputs:
+            print("\n❌ The following inputs refer to a field that was already entered:")
+            for repeated in repeated_inputs:
+                print(f"   - {repeated}")
+            print("\n❌ Each field can only be mapped once. Please try again.")
+            continue
+        
         # Handle duplicate mappings
         if duplicate_mappings:
             print("\n⚠️  The following fields already have mappings for this form:")
@@ -368,7 +599,7 @@ def main():
         
         # Insert mappings
         print("\n🔄 Inserting mappings...")
-        if insert_mappings(conn, form_id, resolved_fields):
+        if insert_mappings(cursor, form_uuid, resolved_fields):
             print("\n" + "=" * 60)
             print("✔ Mapping completed successfully!")
             print("✔ order_index assigned automatically (1 to {})".format(len(resolved_fields)))
@@ -380,8 +611,12 @@ def main():
         if another != 'y':
             break
     
-    # Close connection
-    conn.close()
+    # Close cursor and release connection back to the pool
+    executor.shutdown(wait=False)  # Do not wait here on a hung prefetch
+    if conn:
+        cursor.close()
+        release_connection(conn)
+    close_all_connections()
     print("\n👋 Goodbye!")
 
 
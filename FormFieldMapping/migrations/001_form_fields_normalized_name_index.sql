@@ -0,0 +1,13 @@
+-- Functional index for Field Name lookups in FormFieldMapping/main.py.
+--
+-- The expression must stay identical to NORMALIZED_NAME_SQL in main.py,
+-- otherwise the planner will not use this index.
+-- It only matches Python's normalize_field_name for ASCII field names; see the
+-- NORMALIZED_NAME_SQL comment for the LC_CTYPE caveats.
+--
+-- Run once with search_path set to the application schema (SCHEMA in
+-- config/db_config.py). CONCURRENTLY avoids blocking writes to form_fields
+-- while the index builds; it cannot run inside a transaction block.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_form_fields_normalized_name
+    ON form_fields (lower(regexp_replace(field_name, '[/_().,[:space:]-]', '', 'g')));
@@ -0,0 +1,20 @@
+-- Unique (form_id, field_id) index on form_field_mapping.
+--
+-- insert_mappings in FormFieldMapping/main.py uses
+-- ON CONFLICT (form_id, field_id) DO NOTHING to detect duplicate mappings,
+-- which requires this index to exist.
+--
+-- Run once with search_path set to the application schema (SCHEMA in
+-- config/db_config.py). CONCURRENTLY avoids blocking writes to the mapping
+-- table while the index builds; it cannot run inside a transaction block.
+--
+-- The build fails if duplicate (form_id, field_id) rows already exist. Find
+-- and resolve them first with:
+--
+--   SELECT form_id, field_id, count(*)
+--   FROM form_field_mapping
+--   GROUP BY form_id, field_id
+--   HAVING count(*) > 1;
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS uq_form_field_mapping_form_field
+    ON form_field_mapping (form_id, field_id);
@@ -1,10 +1,12 @@
 """
 Database Connection Utilities
 -----------------------------
-Handles PostgreSQL database connections.
+Handles PostgreSQL database connections through a small connection pool.
 """
 
 import psycopg2
+import psycopg2.pool
+from psycopg2.extras import register_uuid
 from psycopg2 import sql
 import sys
 import os
@@ -14,25 +16,69 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from config.db_config import DB_CONFIG
 
+POOL_MIN_CONNECTIONS = 1
+POOL_MAX_CONNECTIONS = 4
 
-def get_connection():
+_pool = None
+
+
+def _get_pool():
     """
-    Establish and return a database connection.
+    Create the connection pool on first use and return it.
     """
-    try:
-        conn = psycopg2.connect(
+    global _pool
+    if _pool is None:
+        # Send and receive uuid columns as uuid.UUID instead of str
+        register_uuid()
+        _pool = psycopg2.pool.ThreadedConnectionPool(
+            POOL_MIN_CONNECTIONS,
+            POOL_MAX_CONNECTIONS,
             host=DB_CONFIG["host"],
             port=DB_CONFIG["port"],
             database=DB_CONFIG["database"],
             user=DB_CONFIG["user"],
-            password=DB_CONFIG["password"]
+            password=DB_CONFIG["password"],
+            # TCP keepalives so a dead socket errors out instead of hanging forever
+            keepalives=1,
+            keepalives_idle=30,
+            keepalives_interval=10,
+            keepalives_count=3
         )
-        return conn
+    return _pool
+
+
+def get_connection():
+    """
+    Get a database connection from the pool.
+    Return it with release_connection() when done.
+    """
+    try:
+        return _get_pool().getconn()
     except psycopg2.Error as e:
         print(f"❌ Database connection failed: {e}")
         return None
 
 
+def release_connection(conn):
+    """
+    Return a connection to the pool.
+    Broken connections are closed instead of being reused.
+    """
+    if conn is None or _pool is None:
+        return
+    _pool.putconn(conn, close=bool(conn.closed))
+
+
+def close_all_connections():
+    """
+    Close every connection held by the pool.
+    """
+    global _pool
+    if _pool is not None:
+        _pool.closeall()
+        _pool = None
+
+
 def test_connection():
     """
     Test the database connection.
@@ -40,6 +86,6 @@ def test_connection():
     conn = get_connection()
     if conn:
         print("✔ Database connection successful!")
-        conn.close()
+        release_connection(conn)
         return True
     return False
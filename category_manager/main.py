@@ -10,7 +10,7 @@ Usage:
 
 import sys
 import os
-import re
+import uuid
 from typing import List, Tuple
 
 # Add parent directory to path for imports
@@ -18,17 +18,26 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 from utils.db_connection import DatabaseConnection
 
 
-UUID_PATTERN = re.compile(
-    r'^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$'
+DESCRIPTION_TEMPLATES = (
+    "Category for managing {} related items",
+    "Contains all {} related entries",
+    "Handles {} classification and organization",
+    "Groups items related to {} topic",
+    "Organizes content under {} classification",
 )
 
 
-def get_valid_uuid(prompt: str) -> str:
+def get_valid_uuid(prompt: str) -> uuid.UUID:
     """Get a valid UUID from user input."""
     while True:
         value = input(prompt).strip()
-        if UUID_PATTERN.match(value):
-            return value
+        try:
+            parsed = uuid.UUID(value)
+            # uuid.UUID also accepts braces, urn:uuid: and bare hex; require 8-4-4-4-12
+            if str(parsed) == value.lower():
+                return parsed
+        except ValueError:
+            pass
         print(" Invalid UUID format. Expected: xxxxxxxx-xxxx-xxxx-xxxx-xxxxxxxxxxxx")
 
 
@@ -36,16 +45,8 @@ def generate_description(category_name: str) -> str:
     """Generate a short description (6-10 words) from the category name."""
     clean_name = category_name.strip().lower()
     
-    templates = [
-        f"Category for managing {clean_name} related items",
-        f"Contains all {clean_name} related entries",
-        f"Handles {clean_name} classification and organization",
-        f"Groups items related to {clean_name} topic",
-        f"Organizes content under {clean_name} classification"
-    ]
-    
-    index = len(clean_name) % len(templates)
-    description = templates[index]
+    template = DESCRIPTION_TEMPLATES[len(clean_name) % len(DESCRIPTION_TEMPLATES)]
+    description = template.format(clean_name)
     
     words = description.split()
     if len(words) > 10:
@@ -104,18 +105,25 @@ def collect_category_names_multiline(count: int, indent: str) -> List[Tuple[str,
         lines = []
         empty_line_count = 0
         
-        while True:
-            try:
-                line = input()
+        if not sys.stdin.isatty():
+            # Piped input: read straight from the stream instead of one input() per line
+            for line in iter(sys.stdin.readline, ""):
                 if line.strip() == "":
-                    empty_line_count += 1
-                    if empty_line_count >= 1:  # One empty line to finish
-                        break
-                else:
-                    empty_line_count = 0
-                    lines.append(line.strip())
-            except EOFError:
-                break
+                    break
+                lines.append(line.strip())
+        else:
+            while True:
+                try:
+                    line = input()
+                    if line.strip() == "":
+                        empty_line_count += 1
+                        if empty_line_count >= 1:  # One empty line to finish
+                            break
+                    else:
+                        empty_line_count = 0
+                        lines.append(line.strip())
+                except EOFError:
+                    break
         
         # Filter out empty lines and get unique non-empty names
         names = [line for line in lines if line]
@@ -138,15 +146,37 @@ def collect_category_names_multiline(count: int, indent: str) -> List[Tuple[str,
         return categories
 
 
-def process_subcategories_depth_first(db: DatabaseConnection, entity_id: str,
+def stage_categories(pending: List[Tuple[uuid.UUID, str, str, uuid.UUID]],
+                     categories: List[Tuple[str, str]],
+                     parent_category_id: uuid.UUID) -> List[dict]:
+    """
+    Assign client-side UUIDs to categories and queue them for insertion.
+    
+    Args:
+        pending: Rows (id, name, description, parent_category_id) queued so far
+        categories: List of tuples (name, description)
+        parent_category_id: Parent category UUID (None for top-level)
+    
+    Returns:
+        List of dicts with 'id' and 'name' keys in the same order as input
+    """
+    staged = []
+    for name, description in categories:
+        cat_id = uuid.uuid4()
+        pending.append((cat_id, name, description, parent_category_id))
+        staged.append({'id': cat_id, 'name': name})
+    return staged
+
+
+def process_subcategories_depth_first(pending: List[Tuple[uuid.UUID, str, str, uuid.UUID]],
                                       categories: List[dict], level: int):
     """
     Process subcategories in depth-first order.
     For each category, ask if subcategories exist, then go deep before moving to siblings.
+    Subcategories are only queued here; nothing is written until the final commit.
     
     Args:
-        db: Database connection
-        entity_id: Entity UUID for all categories
+        pending: Rows queued for the final bulk insert
         categories: List of dicts with 'id' and 'name' keys
         level: Current depth level
     """
@@ -168,26 +198,15 @@ def process_subcategories_depth_first(db: DatabaseConnection, entity_id: str,
             # Collect all subcategory names via multi-line input
             sub_categories = collect_category_names_multiline(sub_count, indent)
             
-            # Bulk insert all subcategories
-            print(f"{indent}Inserting {sub_count} subcategories...")
-            sub_ids = db.bulk_insert_categories(
-                categories=sub_categories,
-                entity_id=entity_id,
-                parent_category_id=cat_id
-            )
-            
-            # Create list of inserted subcategories with IDs
-            inserted_subs = []
-            for i, (name, desc) in enumerate(sub_categories):
-                sub_id = sub_ids[i]
-                inserted_subs.append({'id': sub_id, 'name': name})
-                print(f"{indent}  ✓ Inserted: '{name}' (ID: {sub_id})")
+            # Queue all subcategories under this parent
+            staged_subs = stage_categories(pending, sub_categories, parent_category_id=cat_id)
+            for sub in staged_subs:
+                print(f"{indent}  ✓ Queued: '{sub['name']}' (ID: {sub['id']})")
             
             # Recursively process subcategories (depth-first)
             process_subcategories_depth_first(
-                db=db,
-                entity_id=entity_id,
-                categories=inserted_subs,
+                pending=pending,
+                categories=staged_subs,
                 level=level + 1
             )
         else:
@@ -214,6 +233,10 @@ def main():
         entity_id = get_valid_uuid("Enter the Entity ID (UUID format): ")
         print(f"✓ Entity ID set to: {entity_id}")
         
+        # All categories are queued here (parents before children) and
+        # inserted in one bulk statement after confirmation
+        pending = []
+        
         # Step 1: Get top-level categories
         print("\n" + "=" * 60)
         print("STEP 1: Top-Level Categories")
@@ -224,20 +247,10 @@ def main():
         # Collect all top-level category names via multi-line input
         top_categories = collect_category_names_multiline(top_count, "")
         
-        # Bulk insert top-level categories (parent_category_id = NULL)
-        print(f"\nInserting {top_count} top-level categories...")
-        top_ids = db.bulk_insert_categories(
-            categories=top_categories,
-            entity_id=entity_id,
-            parent_category_id=None
-        )
-        
-        # Create list of inserted categories with IDs
-        inserted_top = []
-        for i, (name, desc) in enumerate(top_categories):
-            cat_id = top_ids[i]
-            inserted_top.append({'id': cat_id, 'name': name})
-            print(f"  ✓ Inserted: '{name}' (ID: {cat_id})")
+        # Queue top-level categories (parent_category_id = NULL)
+        staged_top = stage_categories(pending, top_categories, parent_category_id=None)
+        for cat in staged_top:
+            print(f"  ✓ Queued: '{cat['name']}' (ID: {cat['id']})")
         
         # Step 2: Process each top-level category depth-first
         print("\n" + "=" * 60)
@@ -245,17 +258,18 @@ def main():
         print("=" * 60)
         
         process_subcategories_depth_first(
-            db=db,
-            entity_id=entity_id,
-            categories=inserted_top,
+            pending=pending,
+            categories=staged_top,
             level=1
         )
         
         # Confirm and commit
         print("\n" + "=" * 60)
-        confirm = get_yes_no("Commit all changes to database? (y/n): ")
+        confirm = get_yes_no(f"Commit all {len(pending)} categories to database? (y/n): ")
         
         if confirm:
+            print(f"\nInserting {len(pending)} categories...")
+            db.insert_category_tree(pending, entity_id=entity_id)
             db.commit()
             print("\n✓ All categories have been successfully inserted!")
         else:
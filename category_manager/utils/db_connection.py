@@ -6,15 +6,31 @@ Handles PostgreSQL database connections and operations.
 
 import psycopg2
 from psycopg2 import sql
+from psycopg2.extras import execute_values, register_uuid
 from contextlib import contextmanager
 import sys
 import os
+import io
+import uuid
 from typing import List, Tuple
 
 # Add parent directory to path for imports
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config.db_config import DB_CONFIG, CATEGORY_SCHEMA, CATEGORY_TABLE
 
+# Batches at least this large are loaded with COPY instead of a multi-row INSERT
+COPY_THRESHOLD = 500
+
+# Escapes for PostgreSQL COPY text format
+_COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+def _copy_text_value(value) -> str:
+    """Format a single value for PostgreSQL COPY text format."""
+    if value is None:
+        return "\\N"
+    return str(value).translate(_COPY_ESCAPES)
+
 
 class DatabaseConnection:
     """Manages PostgreSQL database connections and category operations."""
@@ -34,6 +50,7 @@ class DatabaseConnection:
                 password=DB_CONFIG["password"]
             )
             self.connection.autocommit = False  # Use transactions
+            register_uuid(conn_or_curs=self.connection)  # uuid columns <-> uuid.UUID
             self.cursor = self.connection.cursor()
             print("✓ Successfully connected to the database.")
             return True
@@ -49,56 +66,61 @@ class DatabaseConnection:
             self.connection.close()
             print("✓ Database connection closed.")
     
-    def bulk_insert_categories(self, categories: List[Tuple[str, str]], 
-                                entity_id: str, 
-                                parent_category_id: str = None) -> List[str]:
+    def insert_category_tree(self, categories: List[Tuple[uuid.UUID, str, str, uuid.UUID]],
+                             entity_id: uuid.UUID) -> int:
         """
-        Bulk insert multiple categories in a single SQL statement.
+        Bulk insert a whole category hierarchy with client-generated IDs.
         
         Args:
-            categories: List of tuples (name, description)
+            categories: List of tuples (id, name, description, parent_category_id),
+                        ordered so that every parent comes before its children
             entity_id: Entity UUID (same for all categories)
-            parent_category_id: Parent category UUID (None for top-level)
         
         Returns:
-            List of auto-generated UUIDs in the same order as input
+            Number of rows inserted
         """
         if not categories:
-            return []
+            return 0
         
         try:
-            # Build VALUES clause for bulk insert
-            values_template = "(%s, %s, %s, %s, %s, %s)"
-            values_list = []
-            params = []
-            
-            for name, description in categories:
-                values_list.append(values_template)
-                params.extend([
+            rows = [
+                (
+                    cat_id,
                     name,
                     description,
                     "OTHER",      # Default category_type
                     "PUBLIC",     # Default visibility_scope
                     entity_id,
                     parent_category_id
-                ])
+                )
+                for cat_id, name, description, parent_category_id in categories
+            ]
+            
+            columns = "(id, name, description, category_type, visibility_scope, entity_id, parent_category_id)"
+            
+            if len(rows) >= COPY_THRESHOLD:
+                # IDs are generated client-side, so COPY can be used (no RETURNING needed)
+                buffer = io.StringIO()
+                for row in rows:
+                    buffer.write("\t".join(_copy_text_value(value) for value in row) + "\n")
+                buffer.seek(0)
+                self.cursor.copy_expert(
+                    f"COPY {CATEGORY_SCHEMA}.{CATEGORY_TABLE} {columns} FROM STDIN WITH (FORMAT text)",
+                    buffer
+                )
+                return len(rows)
             
-            # Construct the bulk insert query
             insert_query = f"""
                 INSERT INTO {CATEGORY_SCHEMA}.{CATEGORY_TABLE} 
-                (name, description, category_type, visibility_scope, entity_id, parent_category_id)
-                VALUES {', '.join(values_list)}
-                RETURNING id
+                {columns}
+                VALUES %s
             """
             
-            self.cursor.execute(insert_query, params)
-            
-            # Get all auto-generated IDs (in insertion order)
-            generated_ids = [row[0] for row in self.cursor.fetchall()]
-            return generated_ids
+            execute_values(self.cursor, insert_query, rows, page_size=1000)
+            return len(rows)
             
         except psycopg2.Error as e:
-            print(f"✗ Error bulk inserting categories: {e}")
+            print(f"✗ Error inserting category hierarchy: {e}")
             self.connection.rollback()
             raise
     